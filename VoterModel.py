@@ -8,106 +8,68 @@ import networkx as nx
 import numpy as np
 import matplotlib.pyplot as plt
 import imageio
-from collections import defaultdict
+
+import vm_kernels
 
 
 class Voter:
-    """Representation of a single voter in a larger model"""
+    """
+    View of a single voter stored in a larger model's arrays
+
+    Votes are not buffered per Voter, the model tallies them for all voters
+    at once from its sparse adjacency matrix
+    """
     voting_methods = ('simple', 'probability', 'weighted_prob', 'single_neighbor')
 
-    def __init__(self, degree, belief=0, paccept=1.0):
+    def __init__(self, model, index):
         """
         Construct a Voter
 
         Parameters:
-          degree: the degree of the node representing this Voter
-          belief: initial belief, tuple of value {0, 1, 2} and weight [0, 1]
-          paccept: probability of accepting a belief update
+          model: the VoterModel whose arrays hold this Voter's state
+          index: the node in the model's graph representing this Voter
         """
-        self.degree = degree
-        self.belief = belief
-        self.paccept = paccept
+        self._model = model
+        self.index = index
 
-        self._votes = []
-        
+    @property
+    def degree(self):
+        """The degree of the node representing this Voter"""
+        return int(self._model.degree[self.index])
 
-    def exchange_votes(self, other):
-        """Exchange votes across an edge"""
-        self._votes.append(other.belief)
-        other._votes.append(self.belief)
-
-    def push_vote(self, other):
-        """Push self's belief on the other without receiving the other's belief"""
-        other._votes.append(self.belief)
-
-    def update(self, method):
-        assert method in self.voting_methods, "unknown voting method"
-        if not self._votes:
-            return
-        cnts = defaultdict(lambda : 0)
-        wgts = defaultdict(lambda : 0)
-        # Voter's pre-existing belief carries weight
-        if self.belief[0] != 0:
-            cnts[self.belief[0]] += 1
-            wgts[self.belief[0]] += self.belief[1]
-        for v in self._votes:
-            if v[0] == 0:
-                continue  # Neutral votes don't cause belief changes
-            cnts[v[0]] += 1
-            wgts[v[0]] += v[1]
-        ##### SIMPLE #####
-        if method in ["simple", "single_neighbor"]:
-            # Majority non-neutral vote wins
-            # Probabilistically accept update
-            accept = np.random.rand() < self.paccept
-            b_new = self.belief[0]
-            cnt_max = 0
-            for b in cnts:
-                # Allow other beliefs to override internal if the count is equal
-                # Necessary for the all-unique and single-voter cases to run
-                if cnts[b] > cnt_max or (cnts[b] == cnt_max and b != self.belief[0]):
-                    b_new = b
-                    cnt_max = cnts[b]
-            self.belief = (b_new, 1.)
-        ##### PROBABILITY #####
-        elif method == "probability":
-            # Get the probabilities for each belief
-            belief_list = list(cnts.keys())
-            belief_probs = [cnts[b] / (self.degree + 1) for b in belief_list] # self-vote adds a degree
-            # Add the probability of no change
-            belief_list += [-1]
-            belief_probs += [1 - sum(belief_probs)]
-            draw = np.random.choice(belief_list, p=np.array(belief_probs))
-            if draw == -1:
-                draw = self.belief[0]
-            self.belief = (draw, 1.)
-        ##### WEIGHTED PROBABILITY #####
-        elif method == "weighted_prob":
-            belief_list = list(wgts.keys())
-            belief_probs = [wgts[b] / (self.degree + 1) for b in belief_list]
-            # Add the probability of no change
-            belief_list += [-1]
-            belief_probs += [1 - sum(belief_probs)]
-            belief_probs = [x*(x>=0) for x in belief_probs]
-            draw = np.random.choice(belief_list, p=np.array(belief_probs))
-            if draw == -1:
-                pass
-            else:
-                new_wgt = wgts[draw] / self.degree
-                if draw == self.belief[0]:
-                    # Beliefs don't decrease in strength
-                    new_wgt = max(wgts[draw] / (self.degree + 1), self.belief[1])
-                self.belief = (draw, new_wgt)
-        # Reset the votes for the next update
-        self._votes = []
+    @property
+    def paccept(self):
+        """Probability of accepting a belief update"""
+        return float(self._model.paccept[self.index])
+
+    @property
+    def belief(self):
+        """Belief as a tuple of value {0, 1, 2} and weight [0, 1]"""
+        return (int(self._model.beliefs[self.index]),
+                float(self._model.belief_weights[self.index]))
+
+    @belief.setter
+    def belief(self, belief):
+        self._model.beliefs[self.index], self._model.belief_weights[self.index] = belief
+
+
+def _run_starts(*keys):
+    """Mask of the entries of sorted key arrays that start a run of equal keys"""
+    starts = np.ones(len(keys[0]), dtype=bool)
+    if len(starts) > 1:
+        starts[1:] = np.any([key[1:] != key[:-1] for key in keys], axis=0)
+    return starts
 
 
 class VoterModel:
     """A class for building, running, and a, nalyzing voter models"""
     init_methods = ('rand_pair', 'all_rand', 'all_rand_two', 'all_rand_n', 'all_unique')
     visualization_methods = ('shell', 'random', 'kamada_kawai', 'spring', 'spectral', 'circular')
+    # bwr colormap value of each belief in {neutral=0, b1=1, b2=2}
+    _bwr_table = np.array([0, 1, -1], dtype=np.float32)
 
-    def __init__(self, graph=None, voting='simple', clock='discrete', nbeliefs=2, visualization='shell', redraw=False):
+    def __init__(self, graph=None, voting='simple', clock='discrete', nbeliefs=2, visualization='shell', redraw=False,
+                 nthreads=None, seed=None):
         """
         Construct a VoterModel.
 
@@ -123,9 +85,15 @@ class VoterModel:
           visualization: string representing the visualization method
           redraw: boolean which is true if visualization plots should be 
                   redrawn on the same axes and false otherwise
+          nthreads: number of threads used by the compiled voter sweeps
+                    every core is used if None
+          seed: seed for the model's random number generator
+                fresh entropy is used if None
         """
+        # Private generator for every random draw the model makes
+        self._rng = np.random.default_rng(np.random.SFC64(seed))
         if graph is None:
-            self.graph = nx.erdos_renyi_graph(50, 0.125)
+            self.graph = nx.fast_gnp_random_graph(50, 0.125, seed=self._nx_seed())
         else:
             self.graph = graph
         
@@ -133,6 +101,26 @@ class VoterModel:
 
         assert voting in Voter.voting_methods, "voting method must be in {}".format(Voter.voting_methods)
         self.voting = voting
+        # Discrete time sweep for the voting method, resolved once here
+        # Without numba the numpy sweeps beat running the kernels as python
+        self._kernel = {'simple': vm_kernels.sweep_simple,
+                        'single_neighbor': vm_kernels.sweep_simple,
+                        'probability': vm_kernels.sweep_probability,
+                        'weighted_prob': vm_kernels.sweep_weighted}[voting]
+        if vm_kernels.compiled or voting == 'weighted_prob':
+            self._sweep = self._sweep_kernel
+        else:
+            self._sweep = {'simple': self._sweep_simple,
+                           'single_neighbor': self._sweep_simple,
+                           'probability': self._sweep_probability}[voting]
+        # Compiled loop over exponential clock steps, run by update one step at a
+        # time and by update_batch many at once
+        self._push_kernel = {'simple': vm_kernels.push_simple,
+                             'single_neighbor': vm_kernels.push_simple,
+                             'probability': vm_kernels.push_probability,
+                             'weighted_prob': vm_kernels.push_weighted}[voting]
+        # Which neighbors the woken voters convert
+        self._pick = self._pick_single if voting == 'single_neighbor' else self._pick_all
 
         assert nbeliefs == 2, "only 2 beliefs allowed for now"
         self.nbeliefs = nbeliefs
@@ -140,184 +128,424 @@ class VoterModel:
         assert visualization in self.visualization_methods, "visualization method must be in {}".format(self.visualization_methods)
         self.visualization = visualization
 
-        self._voters = []
+        # Voter state is kept as one array per field, indexed by node
+        n = self.graph.number_of_nodes()
+        # Read every degree in one pass rather than querying node by node
+        degrees = dict(self.graph.degree())
+        self.degree = np.fromiter((degrees[v] for v in range(n)), dtype=np.int32, count=n)
+        # Beliefs never go past n, so one byte per voter is enough on small graphs
+        self.beliefs = np.zeros(n, dtype=np.int8 if n <= np.iinfo(np.int8).max else np.int32)
+        self.belief_weights = np.ones(n, dtype=np.float32)
+        self.paccept = np.ones(n, dtype=np.float32)
+        # Sweeps write the next state here and then swap it with the current one
+        self._next_beliefs = np.empty_like(self.beliefs)
+        self._next_weights = np.empty_like(self.belief_weights)
+        # Isolated voters get no votes and keep their beliefs
+        self._connected = np.flatnonzero(self.degree > 0)
+        if nthreads is not None:
+            vm_kernels.set_num_threads(nthreads)
+        self._nlabels = 0
+        self._draws = None
+        self.history = None
+
+        # CSR neighbor index: the neighbors of node i are
+        # self._indices[self._indptr[i]:self._indptr[i+1]], listed in the order
+        # their votes arrive when votes are exchanged along self.graph.edges
+        edges = np.array(list(self.graph.edges()), dtype=np.int32).reshape(-1, 2)
+        receiver = np.concatenate([edges[:, 0], edges[:, 1]])
+        sender = np.concatenate([edges[:, 1], edges[:, 0]])
+        arrival = np.tile(np.arange(len(edges)), 2)
+        order = np.lexsort((arrival, receiver))
+        self._indptr = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(np.bincount(receiver, minlength=n), out=self._indptr[1:])
+        self._indices = sender[order]
+        # Arrival position of each neighbor's vote, after the voter's own (0)
+        rows = np.repeat(np.arange(n), np.diff(self._indptr))
+        self._arrival = (np.arange(len(self._indices)) - self._indptr[rows] + 1).astype(np.int32)
+        self._rows = rows
+        # Slots for the simple and probability kernels to sort each voter's votes in
+        self._scratch = np.empty(len(self._indices) + n, dtype=np.int64)
+        # Edges drawn by every frame, listed once instead of walking the graph each time
+        self._edgelist = list(self.graph.edges())
         
         self.redraw = redraw
         
         self.node_pos = None
         
         if self.visualization == 'shell':
-            pass
+            pass  # Laid out from the initial beliefs by initialize
         elif self.visualization == 'random':
-            self.node_pos=nx.random_layout(self.graph) 
+            self.node_pos=nx.random_layout(self.graph, seed=self._nx_seed())
         elif self.visualization == 'kamada_kawai':
-            pass
+            # Solving for this layout is expensive, so only do it once
+            self.node_pos=nx.kamada_kawai_layout(self.graph)
         elif self.visualization == 'spring':
-            self.node_pos=nx.spring_layout(self.graph) 
+            self.node_pos=nx.spring_layout(self.graph, seed=self._nx_seed())
         elif self.visualization == 'spectral':
             self.node_pos=nx.spectral_layout(self.graph) 
         elif self.visualization == 'circular':
             self.node_pos=nx.circular_layout(self.graph) 
 
         self.init_method = None
+        self._writer = None
+        self._nodes = None
+        self._labels = None
         
         
         
 
-    def initialize(self, init_method, k=0):
-        """Initialize nodes based on a model"""
+    def _nx_seed(self):
+        """Seed for a networkx function's own random draws, from the model's generator"""
+        return int(self._rng.integers(2**32))
+
+    def initialize(self, init_method, k=0, gif=None, fps=1, dpi=None):
+        """
+        Initialize nodes based on a model
+
+        Parameters:
+          init_method: string representing the initialization method
+          k: the number of voters given belief 1 by all_rand_two
+          gif: file name to stream every drawn frame to as a gif
+               frames are kept in memory for save_gif if None
+          fps: frame rate of the streamed gif
+          dpi: resolution of the drawn figures and so of the gif frames,
+               matplotlib's default if None
+        """
         assert init_method in self.init_methods, "initialization method must be in {}".format(self.init_methods)
-        degrees = [(n, nx.degree(self.graph, n)) for n in self.graph.nodes]
+        n = self.graph.number_of_nodes()
+        self.belief_weights[:] = 1.
+        self.paccept[:] = 1.
         if init_method == "rand_pair":
-            self._voters = [Voter(d, (0, 1.), 1.0) for _, d in degrees]
-            vupdate = np.random.choice(self.graph.order(), 2)
-            self._voters[vupdate[0]].belief = (1, 1.)
-            self._voters[vupdate[1]].belief = (2, 1.)
+            self.beliefs[:] = 0
+            vupdate = self._rng.integers(self.graph.order(), size=2)
+            self.beliefs[vupdate[0]] = 1
+            self.beliefs[vupdate[1]] = 2
         elif init_method == "all_rand":
-            self._voters = [Voter(d, (np.random.choice([0, 1, 2]), 1.), 1.0) for _, d in degrees] 
+            self.beliefs[:] = self._rng.integers(0, 3, size=n, dtype=self.beliefs.dtype)
             
         elif init_method == "all_rand_two":
             # Sets k voters to Belief 1, the remaining n-k voters to Belief 2
-            self._voters = []
-            n = self.graph.number_of_nodes()
-            for i in range(1,k+1):
-                _, d = degrees[i-1]
-                self._voters.append(Voter(d, (1, 1.), 1.0))
-            for i in range(k+1,n+1):
-                _, d = degrees[i-1]
-                self._voters.append(Voter(d, (2, 1.), 1.0))
+            self.beliefs[:k] = 1
+            self.beliefs[k:] = 2
             
         elif init_method == "all_rand_n":
-            n = self.graph.number_of_nodes()
-            self._voters = [Voter(d, (np.random.randint(1,high=(n+1)), 1.), 1.0) for _, d in degrees]
+            self.beliefs[:] = self._rng.integers(1, n+1, size=n, dtype=self.beliefs.dtype)
             
         elif init_method == "all_unique":
-            self._voters = []
-            n = self.graph.number_of_nodes()
-            for i in range(1,n+1):
-                _, d = degrees[i-1]
-                self._voters.append(Voter(d, (i, 1.), 1.0))
+            self.beliefs[:] = np.arange(1, n+1)
+        # Beliefs only spread, so the initial values bound every later tally
+        self._nlabels = int(self.beliefs.max()) + 1 if n else 1
+        # Label text of every belief value, so frames don't format numbers
+        self._label_table = np.array([str(b) for b in range(self._nlabels)], dtype=object)
 
         self.init_method = init_method
+        if self.visualization == 'shell':
+            # Neutral voters on the inner shell, the rest on the outer one,
+            # fixed from here on so frames don't recompute the layout
+            nonneutral = np.flatnonzero(self.beliefs != 0).tolist()
+            neutral = np.flatnonzero(self.beliefs == 0).tolist()
+            if len(nonneutral)==0 or len(neutral)==0:
+                self.node_pos = nx.shell_layout(self.graph)
+            else:
+                self.node_pos = nx.shell_layout(self.graph, nlist=[neutral, nonneutral])
         
         # setup drawing and saving the resulting gif   
         if self.redraw:
             plt.ion()
             #self.fig, self.ax = plt.subplots(figsize=(10,5))
-            self.fig = plt.figure()
+            self.fig = plt.figure(dpi=dpi)
             self.ax = self.fig.add_subplot(1,1,1)
         else:
             plt.ioff()
+        self._dpi = dpi
         self._images = []
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = None
+        if gif is not None:
+            self._writer = imageio.get_writer('./'+gif, mode='I', fps=fps)
+        # Node and label artists kept between redrawn frames
+        self._nodes = None
+        self._labels = None
             
 
+    @property
+    def _voters(self):
+        """Voter views of every node, built on demand from the belief arrays"""
+        return [Voter(self, i) for i in range(len(self.beliefs))]
+
     @staticmethod
     def belief_to_bwr(belief):
-        """Convert {neutral=0, b1=1, b2=2} to the bwr colormap"""
-        table = (0, 1, -1)
-        return table[belief[0]] * belief[1]
+        """
+        Convert {neutral=0, b1=1, b2=2} to the bwr colormap
+
+        belief is a (value, weight) pair of scalars or of arrays over voters
+        """
+        return VoterModel._bwr_table[belief[0]] * belief[1]
     
     @staticmethod
     def belief_to_tab10(belief):
-        """Convert to the tab10 colormap"""
+        """
+        Convert to the tab10 colormap
+
+        belief is a (value, weight) pair of scalars or of arrays over voters
+        """
         return belief[0] % 10
         
     def draw(self):
         """Plot the current state with matplotlib"""
         if self.init_method == "all_rand_n" or self.init_method == "all_unique":
-            colors = [self.belief_to_tab10(v.belief) for v in self._voters]
+            colors = self.belief_to_tab10((self.beliefs, self.belief_weights))
             cmap = 'tab10'
         else:
-            colors = [self.belief_to_bwr(v.belief) for v in self._voters]
+            colors = self.belief_to_bwr((self.beliefs, self.belief_weights))
             cmap = 'bwr'
-        labels = {}
-        for n in self.graph.nodes:
-            labels[n] = str(self._voters[n].belief[0])
+        labels = dict(enumerate(self._label_table[self.beliefs].tolist()))
         options = {
             'node_color': colors,
             'labels': labels,
             'font_weight': 'bold',
             'node_size': 200,
             'width': 3,
-            'cmap': cmap
+            'cmap': cmap,
+            'edgelist': self._edgelist
         }
         if self.init_method != "all_rand_n" and self.init_method != "all_unique":
             options['vmin'] = -1
             options['vmax'] = 1
 
-        if self.redraw:
-            self.ax.clear()
+        if self.redraw and self._nodes is not None:
+            # The layout is fixed, so only node colors and labels need updating
+            self._nodes.set_array(np.asarray(colors))
+            if 'vmin' not in options:
+                self._nodes.autoscale()
+            for n, text in self._labels.items():
+                text.set_text(labels[n])
         else:
-            #self.fig, self.ax = plt.subplots(figsize=(10,5))
-            self.fig = plt.figure()
-            self.ax = self.fig.add_subplot(1,1,1)
-        if self.visualization == 'shell':
-            nonneutral = [i for i, b in enumerate(colors) if b != 0]
-            neutral = [i for i, b in enumerate(colors) if b == 0]
-            if len(nonneutral)==0 or len(neutral)==0:
-                nx.draw_shell(self.graph, ax=self.ax, **options)
+            if self.redraw:
+                self.ax.clear()
             else:
-                nx.draw_shell(self.graph, ax=self.ax, nlist=[neutral, nonneutral], **options)
-        elif self.visualization == 'kamada_kawai':
-            nx.draw_kamada_kawai(self.graph, ax=self.ax, **options)   
-        else:
-            nx.draw(self.graph, pos=self.node_pos, ax=self.ax, **options) 
+                #self.fig, self.ax = plt.subplots(figsize=(10,5))
+                self.fig = plt.figure(dpi=self._dpi)
+                self.ax = self.fig.add_subplot(1,1,1)
+            if self.redraw:
+                # Draw the edges once and keep the node and label artists
+                # so later frames can be updated in place
+                self._nodes = nx.draw_networkx_nodes(
+                    self.graph, self.node_pos, ax=self.ax, node_color=colors,
+                    node_size=options['node_size'], cmap=cmap,
+                    vmin=options.get('vmin'), vmax=options.get('vmax'))
+                nx.draw_networkx_edges(self.graph, self.node_pos, ax=self.ax,
+                                       edgelist=self._edgelist, width=options['width'])
+                self._labels = nx.draw_networkx_labels(
+                    self.graph, self.node_pos, labels=labels, ax=self.ax,
+                    font_weight=options['font_weight'])
+                self.ax.set_axis_off()
+            else:
+                nx.draw(self.graph, pos=self.node_pos, ax=self.ax, **options) 
             
 
         # save the resulting figure so that we can make a gif later if wanted    
-        # the following three lines were taken from https://ndres.me/post/matplotlib-animated-gifs-easily/
-        self.fig.canvas.draw()       # draw the canvas, cache the renderer
-        image = np.frombuffer(self.fig.canvas.tostring_rgb(), dtype='uint8')
-        image = image.reshape(self.fig.canvas.get_width_height()[::-1] + (3,))
-        self._images.append(image)
+        if self._writer is not None:
+            self._writer.append_data(self._render(self.fig))
+        else:
+            # Keep a copy of the pixels rather than the buffer the canvas reuses,
+            # so frames don't hold on to their figures
+            self._images.append(self._render(self.fig).copy())
+
+    @staticmethod
+    def _render(fig):
+        """Draw a figure and return a view of its RGB pixels"""
+        # adapted from https://ndres.me/post/matplotlib-animated-gifs-easily/
+        fig.canvas.draw()       # draw the canvas, cache the renderer
+        # View of the canvas' own pixel buffer, without the alpha channel
+        return np.asarray(fig.canvas.buffer_rgba())[..., :3]
         
     def save_gif(self, fps=1, fname='sim.gif'):
-        """Save all the images in the simulation into a gif"""
-        imageio.mimsave('./'+fname, self._images, fps=fps)
+        """
+        Save all the images in the simulation into a gif
+
+        If frames were streamed to a gif given to initialize, that file is
+        finished instead and fps and fname are ignored
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        else:
+            imageio.mimsave('./'+fname, self._images, fps=fps)
 
-    def update(self):
-        """Vote and update beliefs for all nodes"""
-        current_belief_arr = []
-        updated_belief_arr = []
+    def _tally(self):
+        """
+        Count every connected voter's votes from its neighbors and itself
+
+        Returns (rows, values, cnts, first), one entry per voter and non-neutral
+        belief value that got votes, sorted by voter and then value. first is the
+        position at which the belief's first vote arrived, the voter's own being 0.
+        Only values that got votes are kept, so the tally grows with the number of
+        edges and not with the number of belief values.
+        """
+        n = len(self.beliefs)
+        rows = np.concatenate([np.arange(n), self._rows])
+        values = np.concatenate([self.beliefs, self.beliefs[self._indices]])
+        arrival = np.concatenate([np.zeros(n, dtype=np.int32), self._arrival])
+        # Neutral votes don't cause belief changes, isolated voters get no votes
+        keep = (values != 0) & (self.degree[rows] > 0)
+        rows, values, arrival = rows[keep], values[keep], arrival[keep]
+        order = np.lexsort((arrival, values, rows))
+        rows, values, arrival = rows[order], values[order], arrival[order]
+        # Every run of equal (voter, value) starts with its first arrival
+        start = np.flatnonzero(_run_starts(rows, values))
+        cnts = np.diff(np.r_[start, len(rows)])
+        return rows[start], values[start], cnts, arrival[start]
+
+    def _vote_simple(self, tally, draws):
+        """
+        Majority non-neutral vote wins, decided for every connected voter at once
+
+        Parameters:
+          tally: the votes counted by _tally
+          draws: uniform random draws, one per voter
+        """
+        rows, values, cnts, first = tally
+        # Of the beliefs tied for the majority the last to arrive wins, so
+        # other beliefs override the internal one when the count is equal
+        order = np.lexsort((first, cnts, rows))
+        rows, values = rows[order], values[order]
+        last = np.roll(_run_starts(rows), -1)
+        voters, b_new = rows[last], values[last]
+        # Probabilistically accept update
+        idx = self._connected
+        accept = draws[voters] < self.paccept[voters]
+        self.beliefs[voters[accept]] = b_new[accept]
+        self.belief_weights[idx[draws[idx] < self.paccept[idx]]] = 1.
+
+    def _vote_probability(self, tally, draws):
+        """
+        Draw beliefs in proportion to their votes for every connected voter at once
+
+        Parameters:
+          tally: the votes counted by _tally
+          draws: uniform random draws, one per voter
+        """
+        rows, values, cnts, _ = tally
+        # Cumulative probability of each belief within its voter, self-vote adds a degree
+        new_row = _run_starts(rows)
+        cum = np.cumsum(cnts)
+        base = (cum - cnts)[new_row]
+        cdf = (cum - base[np.cumsum(new_row) - 1]) / (self.degree[rows] + 1)
+        # The first belief whose cumulative probability passes the draw is drawn,
+        # draws past the last belief are the probability of no change
+        hits = np.flatnonzero(draws[rows] < cdf)
+        hits = hits[_run_starts(rows[hits])]
+        self.beliefs[rows[hits]] = values[hits]
+        self.belief_weights[self._connected] = 1.
+
+    def _sweep_simple(self, draws):
+        """Discrete time simple majority update of every voter"""
+        self._vote_simple(self._tally(), draws)
+
+    def _sweep_probability(self, draws):
+        """Discrete time probability update of every voter"""
+        self._vote_probability(self._tally(), draws)
+
+    def _sweep_kernel(self, draws):
+        """Discrete time update of every voter with the voting method's compiled kernel"""
+        self._kernel(self._indptr, self._indices, self.beliefs, self.belief_weights,
+                     self.degree, self.paccept, draws, self._next_beliefs, self._next_weights,
+                     self._scratch)
+        self.beliefs, self._next_beliefs = self._next_beliefs, self.beliefs
+        self.belief_weights, self._next_weights = self._next_weights, self.belief_weights
+
+    def run(self, nsteps):
+        """
+        Run nsteps updates, drawing the voters' randomness for all of them at once
+
+        The beliefs before and after every step are kept in self.history, one row per
+        step, so row 0 holds the starting beliefs. Returns a list with the result of
+        update for every step, whose belief arrays are views of self.history rows.
+        """
+        self._draws = self._rng.random((nsteps, len(self.beliefs)))
+        self.history = np.empty((nsteps + 1, len(self.beliefs)), dtype=self.beliefs.dtype)
+        self.history[0] = self.beliefs
+        try:
+            return [self.update(step) for step in range(nsteps)]
+        finally:
+            self._draws = None
+
+    def _pick_all(self, nodes):
+        """
+        Every neighbor of each woken voter in nodes is converted
+
+        Returns (picks, converted), the neighbor list position converted at every
+        step (-1 for all of them) and the number of neighbors converted.
+        """
+        return np.full(len(nodes), -1, dtype=np.int32), self.degree[nodes]
+
+    def _pick_single(self, nodes):
+        """Convert a single neighbor at random of each woken voter in nodes, as in _pick_all"""
+        picks = (self._rng.random(len(nodes)) * self.degree[nodes]).astype(np.int32)
+        return picks, np.minimum(self.degree[nodes], 1)
+
+    def update_batch(self, k_steps):
+        """
+        Run k_steps exponential clock updates in one compiled loop
+
+        The woken voters and all of the steps' randomness are drawn up front.
+        Beliefs are updated in place without recording each step, so use update
+        to track changes. Returns an array with the time taken by every step.
+        """
+        assert self.clock == "exponential", "batched updates need the exponential clock"
+        n = len(self.beliefs)
+        # The minimum of the voters' rate 1 clocks has mean 1/n
+        times = self._rng.exponential(1. / n, size=k_steps)
+        nodes = self._rng.integers(0, n, size=k_steps, dtype=np.int32)
+        picks, converted = self._pick(nodes)
+        # One draw per converted neighbor, with each step's draws after the last's
+        offsets = np.zeros(k_steps, dtype=np.int64)
+        np.cumsum(converted[:-1], out=offsets[1:])
+        draws = self._rng.random(int(converted.sum()))
+        self._push_kernel(self._indptr, self._indices, self.beliefs, self.belief_weights,
+                          self.degree, self.paccept, nodes, picks, draws, offsets)
+        return times
+
+    def update(self, step=None):
+        """
+        Vote and update beliefs for all nodes
+
+        Parameters:
+          step: row of the draws made by run to use for this update, the
+                beliefs before and after are returned as views of self.history
+                fresh draws are made if None and the beliefs are returned as copies
+        """
         time_arr = []
+        # One uniform random draw per voter
+        if step is None:
+            draws = self._rng.random(len(self.beliefs))
+            # Get current beliefs
+            current_belief_arr = self.beliefs.copy()
+        else:
+            draws = self._draws[step]
         
         ## Exchange votes across edges ##
         # Continuous time, single voter version
         if self.clock == "exponential":
-            # Get current beliefs
-            for v in self._voters:
-                current_belief_arr.append(v.belief[0])
-            updated_belief_arr = current_belief_arr.copy()
             # Every voter has an exponential clock with rate 1
             # The minimum of all these clocks is exponential with rate n and mean 1/n
             # numpy is stupid and uses the mean as the parameter for exponentials.
-            time_arr.append(np.random.exponential(1. / self.graph.number_of_nodes()))
+            time_arr.append(self._rng.exponential(1. / len(self.beliefs)))
             # Which voter woke up?
-            node = np.random.choice(len(self._voters))
-            edges = list(self.graph.edges(node))
-            if self.voting == 'single_neighbor':
-                # Convert a single neighbor at random
-                edge = edges[np.random.choice(len(edges))]
-                neighbor = edge[1] if edge[0] == node else edge[0]
-                self._voters[node].push_vote(self._voters[neighbor])
-                self._voters[neighbor].update(self.voting)
-                updated_belief_arr[neighbor] = self._voters[neighbor].belief[0]
-            else:
-                # Convert all neighbors
-                for e in edges:
-                    neighbor = e[1] if e[0] == node else e[0]
-                    self._voters[node].push_vote(self._voters[neighbor])
-                    self._voters[neighbor].update(self.voting)
-                    updated_belief_arr[neighbor] = self._voters[neighbor].belief[0]
+            nodes = self._rng.integers(len(self.beliefs), size=1, dtype=np.int32)
+            picks, _ = self._pick(nodes)
+            # A single step of the compiled loop, the i-th converted neighbor uses draws[i]
+            self._push_kernel(self._indptr, self._indices, self.beliefs, self.belief_weights,
+                              self.degree, self.paccept, nodes, picks, draws,
+                              np.zeros(1, dtype=np.int64))
         # Discrete time simultaneous voting version
         else:
             time_arr.append(1)
-            for e in self.graph.edges:
-                self._voters[e[0]].exchange_votes(self._voters[e[1]])
-            # Update based on votes
-            for v in self._voters:
-                current_belief_arr.append(v.belief[0])
-                v.update(self.voting)
-                updated_belief_arr.append(v.belief[0])
-
-        return current_belief_arr, updated_belief_arr, time_arr
+            self._sweep(draws)
+
+        if step is None:
+            return current_belief_arr, self.beliefs.copy(), time_arr
+        self.history[step + 1] = self.beliefs
+        return self.history[step], self.history[step + 1], time_arr
@@ -5,27 +5,20 @@
 # 2019-04-20
 
 import networkx as nx
-import numpy as np 
 
 """
 Erdos Renyi Algorithm:
 
 The following algorithm will generate a random graph, G, with n nodes and edges that form with probability p:
-1. Generate a complete graph with n nodes.
-2. For each edge in the graph:
-	a. Delete the edge with probability 1-p.
+1. Generate an empty graph with n nodes.
+2. Starting from the first possible edge, draw the gap to the next edge that forms,
+   which is geometric with success probability p.
+3. Add that edge and repeat from it until the n(n-1)/2 possible edges run out.
 
 """
 
-def erdos_renyi(numNodes, prob):
-	graph = nx.complete_graph(numNodes)
-	final_graph = graph.copy()
-
-	for u,v in graph.edges():
-		if np.random.binomial(1,1-prob,1).tolist()[0] == 1:
-			final_graph.remove_edge(u,v)
-
-	return final_graph
+def erdos_renyi(numNodes, prob, seed=None):
+	return nx.fast_gnp_random_graph(numNodes, prob, seed=seed)
 
 """
 Complete Graph:
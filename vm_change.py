@@ -5,6 +5,7 @@
 # 2019-04-21
 
 import matplotlib.pyplot as plt
+import numpy as np
 
 """
 Track Changes:
@@ -15,12 +16,14 @@ Everytime the beliefs of individuals in the voter population get updated, this f
 """
 
 def track_changes(current_beliefs, updated_beliefs, times, flux_arr, belief_arr, time_arr, beliefs):
-	flux = sum(i != j for i, j in zip(current_beliefs, updated_beliefs))
+	current_beliefs = np.asarray(current_beliefs)
+	updated_beliefs = np.asarray(updated_beliefs)
+	flux = int(np.count_nonzero(current_beliefs != updated_beliefs))
 	flux_arr.append(flux)
 
-	b_arr = []
-	for b in beliefs:
-		b_arr.append(updated_beliefs.count(b)/len(updated_beliefs))
+	# Count every belief value in one pass
+	counts = np.bincount(updated_beliefs, minlength=max(beliefs) + 1)
+	b_arr = (counts[list(beliefs)] / len(updated_beliefs)).tolist()
 	belief_arr.append(b_arr)
 	time_arr.append(times)
 
@@ -63,19 +66,15 @@ Reports the time that it takes for one belief to dominate a voter population.
 """
 
 def convergence_time(time_arr, belief_arr):
-    conv_arr = [i for i in range(len(belief_arr)) if set(belief_arr[i]) == {0,1}]
-    conv_time = 0
-    if len(conv_arr) == 0:
+    step_times = np.array([sum(t) for t in time_arr])
+    shares = np.array(belief_arr, dtype=float, ndmin=2)
+    # A belief has dominated once every share is either 0 or 1, with both present
+    is_zero, is_one = shares == 0, shares == 1
+    converged = (is_zero | is_one).all(axis=1) & is_zero.any(axis=1) & is_one.any(axis=1)
+    if not converged.any():
         # Implies that a belief has not completely dominated a voter population yet
-        for i in range(len(time_arr)):
-            # Return the total time elapsed for iterations (true time for convergence is greater than this value)
-            conv_time += sum(time_arr[i])
-            
-    else:
-        conv_idx = conv_arr[0]
-        for i in range(conv_idx + 1):
-            conv_time += sum(time_arr[i])
+        # Return the total time elapsed for iterations (true time for convergence is greater than this value)
+        return step_times.sum().item()
     
-    return conv_time
-        
-        
\ No newline at end of file
+    conv_idx = np.argmax(converged)
+    return step_times[:conv_idx + 1].sum().item()
@@ -0,0 +1,306 @@
+# vm_kernels.py
+# Compiled kernels for sweeping belief updates over a voter model's graph
+
+import numpy as np
+
+try:
+    from numba import njit, prange, set_num_threads
+    compiled = True
+except ImportError:
+    # Without numba the kernels still work, they just run as plain python
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
+    prange = range
+    compiled = False
+
+    def set_num_threads(n):
+        """Plain python kernels always run on a single thread"""
+
+"""
+Kernels:
+
+Every kernel walks the graph through its CSR neighbor index, where the neighbors of
+voter v are indices[indptr[v]:indptr[v+1]]. A voter's own vote arrives first and its
+neighbors' votes follow in the order the index lists them. All kernels take the same
+arguments, so the model can pick one per voting method and call it the same way.
+Random draws are made by the caller and passed in, one per voter, so the kernels
+themselves are deterministic. New beliefs are written to separate output arrays
+(double buffering) so every voter sees the beliefs from before the sweep, which is
+also what lets voters run in parallel. Voters that need to sort their votes do so
+in scratch, which has a slot for every vote (len(indices) + number of voters);
+voter v owns the degree + 1 slots from indptr[v] + v, so no two voters share one.
+
+Kernels are compiled up front for the array types VoterModel stores: int32 CSR
+indices and degrees, int8 beliefs (int32 on graphs too large for int8), float32
+weights and float64 draws. The compiled code is cached to disk, so every model and
+every session shares it instead of paying the compile on the first sweep.
+"""
+
+def _signatures(args):
+    """Kernel signatures for both belief types, from an argument list using {b} for beliefs"""
+    return ['(' + args.format(b=belief) + ')' for belief in ('int8[::1]', 'int32[::1]')]
+
+_SIGNATURES = _signatures('int32[::1], int32[::1], {b}, float32[::1], int32[::1], float32[::1], '
+                          'float64[::1], {b}, float32[::1], int64[::1]')
+
+@njit(cache=True)
+def _gather_votes(indptr, indices, beliefs, v, stride, scratch):
+    """
+    Sort voter v's non-neutral votes into its slots of scratch and return their count
+
+    A vote is stored as belief * stride + arrival, where arrival is 0 for the voter's
+    own vote and 1 + position in the index for its neighbors', so the sorted votes
+    are grouped by belief and in arrival order within each belief.
+    """
+    base = indptr[v] + v
+    m = 0
+    if beliefs[v] != 0:
+        scratch[base] = beliefs[v] * stride
+        m = 1
+    for j in range(indptr[v], indptr[v+1]):
+        b = beliefs[indices[j]]
+        if b != 0:
+            scratch[base + m] = b * stride + (j - indptr[v] + 1)
+            m += 1
+    scratch[base:base + m].sort()
+    return m
+
+@njit(_SIGNATURES, parallel=True, fastmath=True, cache=True)
+def sweep_simple(indptr, indices, beliefs, weights, degree, paccept, draws, new_beliefs, new_weights,
+                 scratch):
+    """
+    Simple majority update for every voter at once
+
+    Each voter accepts the update with probability paccept. An accepting voter takes
+    the non-neutral belief with the most votes, with ties going to the belief whose
+    first vote arrived last, and resets its weight to 1.
+    """
+    for v in prange(len(beliefs)):
+        new_beliefs[v] = beliefs[v]
+        new_weights[v] = weights[v]
+        deg = degree[v]
+        if deg == 0 or not draws[v] < paccept[v]:
+            continue
+        new_weights[v] = 1.
+        stride = np.int64(deg + 1)
+        base = indptr[v] + v
+        m = _gather_votes(indptr, indices, beliefs, v, stride, scratch)
+        # One pass over the runs of equal beliefs, each run starts at its first vote
+        best = 0
+        first = -1
+        i = 0
+        while i < m:
+            b = scratch[base + i] // stride
+            k = i + 1
+            while k < m and scratch[base + k] // stride == b:
+                k += 1
+            arrival = scratch[base + i] % stride
+            if k - i > best or (k - i == best and arrival > first):
+                best = k - i
+                first = arrival
+                new_beliefs[v] = b
+            i = k
+
+@njit(_SIGNATURES, parallel=True, fastmath=True, cache=True)
+def sweep_probability(indptr, indices, beliefs, weights, degree, paccept, draws, new_beliefs,
+                      new_weights, scratch):
+    """
+    Probability update for every voter at once
+
+    Each voter draws a belief with probability equal to the belief's number of
+    votes over (degree + 1), keeping its current belief otherwise. Beliefs are laid
+    out on the unit interval by value, as in VoterModel._vote_probability, and every
+    voter's weight is reset to 1.
+    """
+    for v in prange(len(beliefs)):
+        new_beliefs[v] = beliefs[v]
+        new_weights[v] = weights[v]
+        deg = degree[v]
+        if deg == 0:
+            continue
+        new_weights[v] = 1.
+        stride = np.int64(deg + 1)
+        base = indptr[v] + v
+        m = _gather_votes(indptr, indices, beliefs, v, stride, scratch)
+        # The drawn belief is the smallest one whose cumulative votes pass the draw
+        i = 0
+        while i < m:
+            b = scratch[base + i] // stride
+            i += 1
+            while i < m and scratch[base + i] // stride == b:
+                i += 1
+            if draws[v] < i / (deg + 1):
+                new_beliefs[v] = b
+                break
+
+@njit(_SIGNATURES, parallel=True, fastmath=True, cache=True)
+def sweep_weighted(indptr, indices, beliefs, weights, degree, paccept, draws, new_beliefs,
+                   new_weights, scratch):
+    """
+    Weighted probability update for every voter at once
+
+    Each voter draws a belief with probability equal to the belief's summed vote
+    weight over (degree + 1), keeping its current belief otherwise. paccept and
+    scratch are not used by this method.
+    """
+    for v in prange(len(beliefs)):
+        new_beliefs[v] = beliefs[v]
+        new_weights[v] = weights[v]
+        deg = degree[v]
+        if deg == 0:
+            continue
+        own = beliefs[v]
+        # Walk the votes in arrival order (own first) until the draw lands on one
+        # A belief's chance of being drawn is the weight of all its votes
+        cum = 0.
+        draw = 0
+        if own != 0:
+            cum += weights[v] / (deg + 1)
+            if draws[v] < cum:
+                draw = own
+        j = indptr[v]
+        while draw == 0 and j < indptr[v+1]:
+            u = indices[j]
+            if beliefs[u] != 0:
+                cum += weights[u] / (deg + 1)
+                if draws[v] < cum:
+                    draw = beliefs[u]
+            j += 1
+        if draw == 0:
+            continue  # No change
+        wgt = weights[v] if own == draw else 0.
+        for j in range(indptr[v], indptr[v+1]):
+            if beliefs[indices[j]] == draw:
+                wgt += weights[indices[j]]
+        if draw == own:
+            # Beliefs don't decrease in strength
+            new_weights[v] = max(wgt / (deg + 1), weights[v])
+        else:
+            new_weights[v] = wgt / deg
+        new_beliefs[v] = draw
+
+_PUSH_SIGNATURES = _signatures('int32[::1], int32[::1], {b}, float32[::1], int32[::1], float32[::1], '
+                               'int32[::1], int32[::1], float64[::1], int64[::1]')
+
+"""
+Push kernels:
+
+The push kernels run a sequence of exponential clock steps, one after another since
+every step sees the beliefs left by the last. At step k voter nodes[k] pushes its
+belief on all of its neighbors, or only on the neighbor at position picks[k] of its
+neighbor list if that is not -1. Each converted neighbor has its own vote and the
+pushed one, and uses draws[offsets[k] + i] for the i-th neighbor converted, so the
+steps' draws lie one after another in a single array.
+"""
+
+@njit(_PUSH_SIGNATURES, fastmath=True, cache=True)
+def push_simple(indptr, indices, beliefs, weights, degree, paccept, nodes, picks, draws,
+                offsets):
+    """
+    Simple majority updates for a sequence of exponential clock steps
+
+    A neighbor that accepts the update, with probability paccept, takes the pushed
+    belief unless it is neutral, as the pushed vote arrives last and wins ties. Its
+    weight is reset to 1.
+    """
+    for k in range(len(nodes)):
+        node = nodes[k]
+        start = indptr[node]
+        end = indptr[node+1]
+        if start == end:
+            continue
+        if picks[k] != -1:
+            start += picks[k]
+            end = start + 1
+        pushed = beliefs[node]
+        for j in range(start, end):
+            u = indices[j]
+            if draws[offsets[k] + j - start] < paccept[u]:
+                if pushed != 0:
+                    beliefs[u] = pushed
+                weights[u] = 1.
+
+@njit(_PUSH_SIGNATURES, fastmath=True, cache=True)
+def push_probability(indptr, indices, beliefs, weights, degree, paccept, nodes, picks, draws,
+                     offsets):
+    """
+    Probability updates for a sequence of exponential clock steps
+
+    A neighbor draws its own or the pushed belief with probability equal to the
+    belief's number of votes over (degree + 1), laid out by value as in
+    sweep_probability. Its weight is reset to 1.
+    """
+    for k in range(len(nodes)):
+        node = nodes[k]
+        start = indptr[node]
+        end = indptr[node+1]
+        if start == end:
+            continue
+        if picks[k] != -1:
+            start += picks[k]
+            end = start + 1
+        pushed = beliefs[node]
+        for j in range(start, end):
+            u = indices[j]
+            own = beliefs[u]
+            weights[u] = 1.
+            # Lowest non-neutral belief among the two votes
+            low = own if pushed == 0 or (own != 0 and own < pushed) else pushed
+            if low == 0:
+                continue
+            nlow = (own == low) + (pushed == low)
+            nall = (own != 0) + (pushed != 0)
+            draw = draws[offsets[k] + j - start]
+            if draw < nlow / (degree[u] + 1):
+                beliefs[u] = low
+            elif draw < nall / (degree[u] + 1):
+                beliefs[u] = own if own != low else pushed
+
+@njit(_PUSH_SIGNATURES, fastmath=True, cache=True)
+def push_weighted(indptr, indices, beliefs, weights, degree, paccept, nodes, picks, draws,
+                  offsets):
+    """
+    Weighted probability updates for a sequence of exponential clock steps
+
+    A neighbor draws its own or the pushed belief with probability equal to the
+    belief's summed vote weight over (degree + 1), laid out by value. paccept is
+    not used by this method.
+    """
+    for k in range(len(nodes)):
+        node = nodes[k]
+        start = indptr[node]
+        end = indptr[node+1]
+        if start == end:
+            continue
+        if picks[k] != -1:
+            start += picks[k]
+            end = start + 1
+        pushed = beliefs[node]
+        pushed_wgt = weights[node]
+        for j in range(start, end):
+            u = indices[j]
+            own = beliefs[u]
+            deg = degree[u]
+            # Lowest non-neutral belief among the two votes
+            low = own if pushed == 0 or (own != 0 and own < pushed) else pushed
+            if low == 0:
+                continue
+            wlow = (weights[u] if own == low else 0.) + (pushed_wgt if pushed == low else 0.)
+            wall = (weights[u] if own != 0 else 0.) + (pushed_wgt if pushed != 0 else 0.)
+            draw = draws[offsets[k] + j - start]
+            if draw < wlow / (deg + 1):
+                b = low
+                wgt = wlow
+            elif draw < wall / (deg + 1):
+                b = own if own != low else pushed
+                wgt = wall - wlow
+            else:
+                continue  # No change
+            if b == own:
+                # Beliefs don't decrease in strength
+                weights[u] = max(wgt / (deg + 1), weights[u])
+            else:
+                weights[u] = wgt / deg
+            beliefs[u] = b